@@ -1,37 +1,144 @@
 import os
 import requests
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 BASE_URL = "https://storage.googleapis.com/gcp-public-data--gnomad/release/3.1.2/vcf/genomes"
 DEST_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../gnomad_grch38_vcf'))
 CHROMOSOMES = list(range(1, 23))
 EXTENSIONS = ["vcf.bgz", "vcf.bgz.tbi"]
 
+MAX_WORKERS = 8          # files downloaded concurrently
+RANGE_PARTS = 4          # byte ranges fetched concurrently per file
+CHUNK_SIZE = 1 << 20     # 1 MiB streaming buffer
+MAX_RETRIES = 3
+TIMEOUT = (10, 60)       # (connect, read) seconds, so a stalled socket fails and is retried
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
+def download_range(url, fd, lo, hi):
+    """Fetch bytes lo..hi (inclusive) of url into fd, resuming from the last written offset on failure."""
+    offset = lo
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            headers = {'Range': f'bytes={offset}-{hi}'}
+            with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise IOError(f"Server ignored range request (HTTP {r.status_code})")
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    # pwrite may write fewer bytes than asked; advance only by what landed
+                    view = memoryview(chunk)
+                    while view:
+                        written = os.pwrite(fd, view, offset)
+                        if written == 0:
+                            raise IOError(f"pwrite wrote no bytes at offset {offset}")
+                        offset += written
+                        view = view[written:]
+            if offset > hi:
+                return
+            raise IOError(f"Short read: got bytes {lo}-{offset - 1} of {lo}-{hi}")
+        except (requests.RequestException, IOError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            logging.warning(f"Retrying {url} from byte {offset} (attempt {attempt}): {e}")
+
+def download_stream(url, part):
+    """Fetch url sequentially into part, resuming from the size of an existing part file."""
+    for attempt in range(1, MAX_RETRIES + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        try:
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+                if offset and r.status_code == 416:
+                    return  # part already holds the whole file
+                r.raise_for_status()
+                # A server that ignores Range resends the whole file, so start over
+                mode = 'ab' if offset and r.status_code == 206 else 'wb'
+                with open(part, mode) as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+            return
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise
+            logging.warning(f"Retrying {url} (attempt {attempt}): {e}")
+
+def read_done_ranges(progress):
+    """Return the (lo, hi) ranges recorded as complete by a previous run."""
+    if not os.path.exists(progress):
+        return set()
+    with open(progress) as f:
+        return {tuple(int(x) for x in line.split('-')) for line in f if line.strip()}
+
 def download_file(url, dest):
     if os.path.exists(dest):
         logging.info(f"File already exists, skipping: {dest}")
         return
     logging.info(f"Downloading {url} -> {dest}")
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-        with open(dest, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+    part = dest + ".part"
+    progress = dest + ".ranges"  # completed ranges of a preallocated part file
+
+    head = requests.head(url, allow_redirects=True, timeout=TIMEOUT)
+    head.raise_for_status()
+    size = int(head.headers.get('Content-Length', 0))
+    ranged = head.headers.get('Accept-Ranges') == 'bytes' and size > 0
+
+    if ranged:
+        step = -(-size // RANGE_PARTS)
+        ranges = [(lo, min(lo + step, size) - 1) for lo in range(0, size, step)]
+        # Ranges finished by an interrupted run are kept if the part file matches
+        done = read_done_ranges(progress)
+        if not (os.path.exists(part) and os.path.getsize(part) == size):
+            done = set()
+        pending = [r for r in ranges if r not in done]
+        if done:
+            logging.info(f"Resuming {dest}: {len(ranges) - len(pending)}/{len(ranges)} ranges already done")
+        # Preallocate the file and fill each range in place
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT, 0o644)
+        lock = threading.Lock()
+        try:
+            os.ftruncate(fd, size)
+            with open(progress, 'a' if done else 'w') as log:
+                def fetch(lo, hi):
+                    download_range(url, fd, lo, hi)
+                    with lock:
+                        log.write(f"{lo}-{hi}\n")
+                        log.flush()
+                with ThreadPoolExecutor(max_workers=RANGE_PARTS) as pool:
+                    futures = [pool.submit(fetch, lo, hi) for lo, hi in pending]
+                    for future in as_completed(futures):
+                        future.result()
+        finally:
+            os.close(fd)
+        os.remove(progress)
+    else:
+        # A part left by a ranged run is preallocated with holes and cannot be resumed by size
+        if os.path.exists(progress):
+            if os.path.exists(part):
+                os.remove(part)
+            os.remove(progress)
+        download_stream(url, part)
+
+    os.replace(part, dest)
     logging.info(f"Download complete: {dest}")
 
 def main():
     os.makedirs(DEST_DIR, exist_ok=True)
-    for chrom in CHROMOSOMES:
-        for ext in EXTENSIONS:
-            fname = f"gnomad.genomes.v3.1.2.sites.chr{chrom}.{ext}"
-            url = f"{BASE_URL}/{fname}"
-            dest = os.path.join(DEST_DIR, fname)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {}
+        for chrom in CHROMOSOMES:
+            for ext in EXTENSIONS:
+                fname = f"gnomad.genomes.v3.1.2.sites.chr{chrom}.{ext}"
+                url = f"{BASE_URL}/{fname}"
+                dest = os.path.join(DEST_DIR, fname)
+                futures[pool.submit(download_file, url, dest)] = url
+        for future in as_completed(futures):
             try:
-                download_file(url, dest)
+                future.result()
             except Exception as e:
-                logging.error(f"Failed to download {url}: {e}")
+                logging.error(f"Failed to download {futures[future]}: {e}")
 
 if __name__ == "__main__":
     main()
@@ -48,7 +48,10 @@ WHERE
     "SNP_GENE_IDS" IS NULL AND
     "CHR_ID" IS NULL AND
     "CHR_POS" IS NULL
-  );
+  )
+
+-- Store rows sorted by rsid so rsid lookups can skip row groups
+ORDER BY rsid;
 
 -- Step 3: Deduplicate by rsid + trait_uri using best pvalue, then strongest effect
 CREATE OR REPLACE TABLE associations_prs_ready AS
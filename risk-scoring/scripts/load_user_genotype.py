@@ -1,7 +1,20 @@
 import os
+import csv
+import itertools
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pac
 from typing import Union
 
+# Bytes read from the start of the file to detect the delimiter
+SNIFF_BYTES = 8192
+# Values read as missing: empty fields and 'NA' (as pandas read them), plus whole-genotype
+# no-call markers ('--' in 23andMe exports; '00' is a joined AncestryDNA no-call)
+NULL_VALUES = ['', 'NA', '--', 'NN', '00']
+# AncestryDNA records a no-call as '0' in each allele column
+ALLELE_NO_CALL = '0'
+
 class GenotypeFileError(Exception):
     """Custom exception for genotype file errors."""
     pass
@@ -30,28 +43,66 @@ def load_user_genotype(filepath: str) -> pd.DataFrame:
 
     # Try reading file
     try:
-        for sep in ['\t', ',', ' ']:
-            try:
-                temp_df = pd.read_csv(filepath, sep=sep, comment='#', dtype=str)
-                columns = [c.lower() for c in temp_df.columns]
-                temp_df.columns = columns
-                # If allele1 and allele2 present, concatenate for genotype
-                if 'rsid' in columns and 'allele1' in columns and 'allele2' in columns:
-                    temp_df['genotype'] = temp_df['allele1'].astype(str) + temp_df['allele2'].astype(str)
-                return temp_df
-            except Exception:
-                continue
-        raise GenotypeFileError("Could not parse file with expected delimiters.")
+        with open(filepath, 'r', newline='') as f:
+            # Count leading '#' comment lines so pyarrow skips them without a per-row check
+            n_comments = sum(1 for _ in itertools.takewhile(lambda line: line.startswith('#'), f))
+            f.seek(0)
+            for _ in range(n_comments):
+                f.readline()
+            head = f.read(SNIFF_BYTES)
+        lines = head.splitlines()
+        if len(head) == SNIFF_BYTES:
+            lines = lines[:-1]  # last line may be truncated
+        if not lines:
+            raise GenotypeFileError("File contains no header row.")
+        sample = '\n'.join(lines)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters='\t, ').delimiter
+        except csv.Error:
+            delimiter = '\t'
+        names = next(csv.reader([lines[0]], delimiter=delimiter))
+        table = pac.read_csv(
+            filepath,
+            read_options=pac.ReadOptions(skip_rows=n_comments),
+            parse_options=pac.ParseOptions(delimiter=delimiter),
+            convert_options=pac.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                null_values=NULL_VALUES,
+                strings_can_be_null=True,
+            ),
+        )
+        columns = [c.lower() for c in table.column_names]
+        table = table.rename_columns(columns)
+        # If allele1 and allele2 present, concatenate for genotype
+        if 'rsid' in columns and 'allele1' in columns and 'allele2' in columns:
+            # Null out no-call alleles so the joined genotype is null, as for '--'
+            allele1, allele2 = (
+                pc.if_else(pc.equal(table[col], ALLELE_NO_CALL), pa.scalar(None, pa.string()), table[col])
+                for col in ('allele1', 'allele2')
+            )
+            genotype = pc.binary_join_element_wise(allele1, allele2, '')
+            if 'genotype' in columns:
+                table = table.set_column(columns.index('genotype'), 'genotype', genotype)
+            else:
+                table = table.append_column('genotype', genotype)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
     except Exception as e:
         raise GenotypeFileError(f"Error reading file: {e}")
 
-    # Validate required columns
-    missing = [col for col in ['rsid', 'genotype'] if col not in df.columns]
-    if missing:
-        raise GenotypeFileError(f"Input file is missing required column(s): {', '.join(missing)}.")
+def rsid_array(df: pd.DataFrame) -> pa.ChunkedArray:
+    """
+    Returns the rsid column of a load_user_genotype DataFrame as a pyarrow ChunkedArray.
+
+    The DataFrame is Arrow-backed, so the chunks share its buffers (one per CSV block
+    read) and can be passed straight to query_gwas without building a Python list.
 
-    # Output only required columns and drop rows with missing values
-    df = df[['rsid', 'genotype']].dropna()
-    if df.empty:
-        raise GenotypeFileError("No valid genotype data found after filtering.")
-    return df
+    Parameters:
+        df (pd.DataFrame): DataFrame returned by load_user_genotype
+
+    Returns:
+        pa.ChunkedArray: rsid values as pyarrow strings
+    """
+    rsids = pa.array(df['rsid'], type=pa.string())
+    if isinstance(rsids, pa.Array):
+        rsids = pa.chunked_array([rsids])
+    return rsids
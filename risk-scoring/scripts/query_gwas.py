@@ -3,39 +3,195 @@ PHITE Risk Scoring: GWAS Query Module
 
 Efficiently filter GWAS association files (.parquet or .duckdb) for a list of rsid values.
 Validates schema and file type, supports large-scale filtering, and returns a pandas DataFrame.
+
+GWAS files should be written sorted by rsid so DuckDB's min/max statistics can skip
+row groups that hold none of the queried rsids, e.g.:
+    COPY (SELECT * FROM associations_clean ORDER BY rsid)
+    TO 'associations_clean.parquet' (FORMAT PARQUET, ROW_GROUP_SIZE 100000);
 """
 import os
-from typing import List, Union
+import contextlib
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Union
+import duckdb
 import pandas as pd
 
+# pyarrow is pinned in requirements.txt and required by load_user_genotype; the
+# list-parameter fallback below only serves callers importing this module alone
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
 REQUIRED_COLUMNS = [
     'rsid', 'risk_allele', 'pvalue', 'beta', 'trait', 'trait_uri', 'study_id',
     'mapped_gene', 'upstream_gene_id', 'downstream_gene_id', 'snp_gene_ids',
     'chr', 'chr_pos', 'context', 'is_intergenic', 'risk_allele_freq', 'ci_95_text'
 ]
+REQUIRED_SET = frozenset(REQUIRED_COLUMNS)
+
+# Projection used by the GWAS query so only required columns are read
+REQUIRED_COLUMNS_SQL = ', '.join(f'a.{col}' for col in REQUIRED_COLUMNS)
+
+# SEMI JOIN so duplicate rsids in the input do not fan out the result
+GWAS_QUERY = f"""
+    SELECT {REQUIRED_COLUMNS_SQL} FROM gwas a
+    SEMI JOIN filter_rsid f USING (rsid)
+"""
+
+# Parquet connections cached across calls, keyed by absolute path; at most
+# _CACHE_SIZE are kept open. Queries on them are serialized by _CON_LOCK.
+_CACHE_SIZE = 4
+_CONNECTIONS = OrderedDict()
+_CON_LOCK = threading.Lock()
 
 class GWASQueryError(Exception):
     """Custom exception for GWAS query errors."""
     pass
 
+def _open_con(gwas_path: str) -> Tuple[duckdb.DuckDBPyConnection, List[str]]:
+    """
+    Open an in-memory DuckDB connection exposing a GWAS file as the view 'gwas'.
+    Args:
+        gwas_path (str): Absolute path to .parquet or .duckdb GWAS file.
+    Returns:
+        Tuple[duckdb.DuckDBPyConnection, List[str]]: Connection and the view's column names.
+    """
+    ext = os.path.splitext(gwas_path)[1].lower()
+    quoted_path = gwas_path.replace("'", "''")
+    con = duckdb.connect(':memory:')
+    try:
+        # Keep Parquet footers and statistics cached between queries
+        con.execute("PRAGMA enable_object_cache")
+        if ext == '.parquet':
+            # DuckDB scans the Parquet file directly with filter pushdown
+            con.execute(f"CREATE VIEW gwas AS SELECT * FROM read_parquet('{quoted_path}')")
+        else:
+            # For DuckDB, assume a table named 'associations_clean' or auto-detect
+            con.execute(f"ATTACH '{quoted_path}' AS gwas_db (READ_ONLY)")
+            # Try to auto-detect the associations table; tables and views, sorted like SHOW TABLES
+            tables = [row[0] for row in con.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_catalog = 'gwas_db' ORDER BY table_name"
+            ).fetchall()]
+            if 'associations_clean' in tables:
+                table = 'associations_clean'
+            elif tables:
+                table = tables[0]  # fallback to first table
+            else:
+                raise GWASQueryError("No tables found in DuckDB file.")
+            con.execute(f'CREATE VIEW gwas AS SELECT * FROM gwas_db."{table}"')
+        columns = [row[0] for row in con.execute("DESCRIBE gwas").fetchall()]
+    except Exception:
+        con.close()
+        raise
+    return con, columns
+
+def _get_con(gwas_path: str) -> Tuple[duckdb.DuckDBPyConnection, List[str]]:
+    """
+    Return the cached connection for a Parquet GWAS file, opening one if needed.
+    Entries are keyed on (mtime_ns, size), so a rewritten file replaces its stale
+    connection; the least recently used entry is closed once _CACHE_SIZE is exceeded.
+    Must be called with _CON_LOCK held.
+    Args:
+        gwas_path (str): Absolute path to a .parquet GWAS file.
+    Returns:
+        Tuple[duckdb.DuckDBPyConnection, List[str]]: Connection and the view's column names.
+    """
+    stat = os.stat(gwas_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _CONNECTIONS.pop(gwas_path, None)
+    if cached is not None:
+        if cached[0] == key:
+            _CONNECTIONS[gwas_path] = cached
+            return cached[1], cached[2]
+        cached[1].close()
+    con, columns = _open_con(gwas_path)
+    _CONNECTIONS[gwas_path] = (key, con, columns)
+    while len(_CONNECTIONS) > _CACHE_SIZE:
+        _, (_, evicted, _) = _CONNECTIONS.popitem(last=False)
+        evicted.close()
+    return con, columns
+
+def close_connections() -> None:
+    """Close all cached GWAS connections."""
+    with _CON_LOCK:
+        while _CONNECTIONS:
+            _, (_, con, _) = _CONNECTIONS.popitem()
+            con.close()
+
+def _run_query(con: duckdb.DuckDBPyConnection, rsids) -> pd.DataFrame:
+    """
+    Join the 'gwas' view on a connection against rsids and return the required columns.
+    Args:
+        con (duckdb.DuckDBPyConnection): Connection from _open_con or _get_con.
+        rsids: Deduplicated rsids, as a pyarrow array or a Python list.
+    Returns:
+        pd.DataFrame: Matching associations.
+    """
+    try:
+        if pa is not None:
+            # Register rsids as an Arrow table for a zero-copy join
+            con.register('filter_rsid', pa.table({'rsid': rsids}))
+            result = con.execute(GWAS_QUERY).arrow()
+            # Newer DuckDB releases return a RecordBatchReader from .arrow()
+            if isinstance(result, pa.RecordBatchReader):
+                result = result.read_all()
+            return result.to_pandas(self_destruct=True)
+        # Pass the whole list as a single array parameter: one statement, no SQL building
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE filter_rsid AS SELECT unnest(?::VARCHAR[]) AS rsid",
+            [rsids]
+        )
+        return con.execute(GWAS_QUERY).df()
+    except Exception as e:
+        raise GWASQueryError(f"Failed to query GWAS file: {e}")
+    finally:
+        if pa is not None:
+            con.unregister('filter_rsid')
+        else:
+            con.execute("DROP TABLE IF EXISTS filter_rsid")
+
+def _rsid_array(rsid_list) -> 'pa.Array':
+    """
+    Convert rsids to a sorted, deduplicated Arrow string array without a Python list copy.
+    Args:
+        rsid_list: List, pandas Series (Arrow-backed or not), or pyarrow (chunked) array of rsids.
+    Returns:
+        pa.Array: Unique, non-null rsids in sorted order.
+    Raises:
+        GWASQueryError: If the values cannot be converted to Arrow strings.
+    """
+    try:
+        if isinstance(rsid_list, (pa.Array, pa.ChunkedArray)):
+            rsids = rsid_list
+        else:
+            # from_pandas treats NaN (e.g. from an object-dtype tolist()) as null
+            rsids = pa.array(rsid_list, from_pandas=True)
+        rsids = pc.unique(pc.drop_null(rsids.cast(pa.string())))
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise GWASQueryError(f"Invalid rsid values: {e}")
+    return pc.take(rsids, pc.array_sort_indices(rsids))
+
 def query_gwas(
     gwas_path: str,
-    rsid_list: List[str]
+    rsid_list: Union[List[str], pd.Series, 'pa.Array', 'pa.ChunkedArray']
 ) -> pd.DataFrame:
     """
     Filter a GWAS association file for a list of rsid values.
     Args:
         gwas_path (str): Path to .parquet or .duckdb GWAS file.
-        rsid_list (List[str]): List of rsid values to filter (can be large).
+        rsid_list (Union[List[str], pd.Series, pa.Array, pa.ChunkedArray]): rsid values to
+            filter (can be large). Arrow arrays and Arrow-backed Series are joined without
+            conversion to Python objects. Duplicate rsids are collapsed and sorted before
+            the join.
     Returns:
         pd.DataFrame: Filtered DataFrame with associations for input rsids.
     Raises:
         GWASQueryError: For validation or processing errors.
     """
-    import pandas as pd
-    import duckdb
-    import os
-
     # Validate file existence
     if not os.path.exists(gwas_path):
         raise GWASQueryError("File does not exist: {}".format(gwas_path))
@@ -46,56 +202,31 @@ def query_gwas(
         raise GWASQueryError("Unsupported file type: {}. Only .parquet and .duckdb are supported.".format(ext))
 
     # If empty rsid list, return empty DataFrame with correct columns
-    if not rsid_list:
+    if len(rsid_list) == 0:
         return pd.DataFrame(columns=REQUIRED_COLUMNS)
 
-    try:
-        if ext == '.parquet':
-            # Use pyarrow backend for speed
-            df = pd.read_parquet(gwas_path, engine='pyarrow')
-        elif ext == '.duckdb':
-            # For DuckDB, assume a table named 'associations_clean' or auto-detect
-            con = duckdb.connect(gwas_path, read_only=True)
-            # Try to auto-detect the associations table
-            tables = [row[0] for row in con.execute("SHOW TABLES").fetchall()]
-            if 'associations_clean' in tables:
-                table = 'associations_clean'
-            elif tables:
-                table = tables[0]  # fallback to first table
-            else:
-                raise GWASQueryError("No tables found in DuckDB file.")
-            # Use DuckDB's efficient filtering for large lists
-            # Convert rsid_list to a DuckDB temp table for join
-            con.execute("CREATE TEMP TABLE filter_rsid (rsid VARCHAR)")
-            # Chunk insert to avoid parameter limits
-            chunk_size = 50000
-            for i in range(0, len(rsid_list), chunk_size):
-                chunk = rsid_list[i:i+chunk_size]
-                con.execute("INSERT INTO filter_rsid VALUES {}".format(
-                    ','.join([f"('{r}')" for r in chunk])
-                ))
-            query = f"""
-                SELECT a.* FROM {table} a
-                INNER JOIN filter_rsid f ON a.rsid = f.rsid
-            """
-            df = con.execute(query).df()
-            con.close()
-        else:
-            raise GWASQueryError("Unsupported file type: {}".format(ext))
-    except Exception as e:
-        raise GWASQueryError(f"Failed to load GWAS file: {e}")
-
-    # Validate required columns
-    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-    if missing:
-        raise GWASQueryError(f"Missing required columns: {', '.join(missing)}")
-
-    # Filter for rsid (for Parquet, do this in pandas for now)
-    if ext == '.parquet':
-        # Use set for fast lookup, but preserve DataFrame order
-        rsid_set = set(rsid_list)
-        df = df[df['rsid'].isin(rsid_set)]
-
-    # Ensure output columns are in correct order
-    df = df[[col for col in REQUIRED_COLUMNS]]
-    return df.reset_index(drop=True)
+    # Collapse duplicates and sort so the join's build side lines up with rsid-sorted files
+    if pa is not None:
+        rsids = _rsid_array(rsid_list)
+    else:
+        # Drop missing rsids, matching pc.drop_null on the Arrow path
+        rsids = sorted({r for r in rsid_list if not pd.isna(r)})
+
+    # Parquet connections are cached; .duckdb files are opened per call so the
+    # database is not held locked between queries
+    gwas_path = os.path.abspath(gwas_path)
+    cached = ext == '.parquet'
+    with _CON_LOCK if cached else contextlib.nullcontext():
+        try:
+            con, columns = _get_con(gwas_path) if cached else _open_con(gwas_path)
+        except Exception as e:
+            raise GWASQueryError(f"Failed to load GWAS file: {e}")
+        try:
+            # Validate required columns
+            missing = REQUIRED_SET.difference(columns)
+            if missing:
+                raise GWASQueryError(f"Missing required columns: {', '.join(sorted(missing))}")
+            return _run_query(con, rsids)
+        finally:
+            if not cached:
+                con.close()
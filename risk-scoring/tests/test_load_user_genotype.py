@@ -59,3 +59,43 @@ def test_empty_file():
     with pytest.raises(GenotypeFileError):
         load_user_genotype(path)
     os.remove(path)
+
+def test_comment_header_csv_detects_delimiter():
+    contents = "# exported genotype data\n# build 37\nrsid,genotype\nrs1,AA\nrs2,--\n"
+    path = write_temp_file(contents, '.csv')
+    df = load_user_genotype(path)
+    assert list(df.columns) == ['rsid', 'genotype']
+    assert df.iloc[0]['genotype'] == 'AA'
+    assert pd.isna(df.iloc[1]['genotype'])
+    os.remove(path)
+
+def test_long_comment_preamble_is_skipped():
+    preamble = "# 23andMe raw data file, notes and disclaimers follow\n" * 400
+    contents = preamble + "rsid\tchromosome\tposition\tgenotype\nrs1\t1\t100\tAG\n"
+    path = write_temp_file(contents, '.txt')
+    df = load_user_genotype(path)
+    assert list(df.columns) == ['rsid', 'chromosome', 'position', 'genotype']
+    assert df.iloc[0]['genotype'] == 'AG'
+    os.remove(path)
+
+def test_ancestrydna_no_call_alleles_are_null():
+    contents = "rsid\tchromosome\tposition\tallele1\tallele2\nrs1\t1\t100\tA\tG\nrs2\t1\t200\t0\t0\n"
+    path = write_temp_file(contents, '.txt')
+    df = load_user_genotype(path)
+    assert df.iloc[0]['genotype'] == 'AG'
+    assert pd.isna(df.iloc[1]['genotype'])
+    os.remove(path)
+
+def test_empty_and_na_fields_are_null():
+    contents = "rsid\tgenotype\nrs1\t\nrs2\tNA\nrs3\tCT\n"
+    path = write_temp_file(contents, '.txt')
+    df = load_user_genotype(path)
+    assert pd.isna(df.iloc[0]['genotype'])
+    assert pd.isna(df.iloc[1]['genotype'])
+    assert df.iloc[2]['genotype'] == 'CT'
+    os.remove(path)
+    contents = "rsid\tchromosome\tposition\tallele1\tallele2\nrs1\t1\t100\tA\t\n"
+    path = write_temp_file(contents, '.txt')
+    df = load_user_genotype(path)
+    assert pd.isna(df.iloc[0]['genotype'])
+    os.remove(path)
@@ -63,3 +63,129 @@ def test_performance_large_input(tmp_path):
     large_rsid_list = [f'rs{i}' for i in range(100)] * 6000  # 600k entries
     result = query_gwas(str(parquet_path), large_rsid_list)
     assert set(result['rsid']) == set(df['rsid'])
+
+def test_duckdb_duplicate_rsids_do_not_fan_out(tmp_path):
+    import duckdb
+    df = make_gwas_df(['rs1', 'rs2', 'rs3'])
+    db_path = tmp_path / "gwas.duckdb"
+    con = duckdb.connect(str(db_path))
+    con.execute("CREATE TABLE associations_clean AS SELECT * FROM df")
+    con.close()
+    result = query_gwas(str(db_path), ['rs1', 'rs3', 'rs1', 'rs1'])
+    assert sorted(result['rsid']) == ['rs1', 'rs3']
+    assert list(result.columns) == REQUIRED_COLUMNS
+
+def test_extra_columns_are_not_returned(tmp_path):
+    df = make_gwas_df(['rs1', 'rs2'])
+    df['extra_stat'] = [1.0, 2.0]
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    result = query_gwas(str(parquet_path), ['rs1'])
+    assert list(result.columns) == REQUIRED_COLUMNS
+
+def test_modified_file_is_requeried(tmp_path):
+    parquet_path = tmp_path / "gwas.parquet"
+    make_gwas_df(['rs1']).to_parquet(parquet_path)
+    assert list(query_gwas(str(parquet_path), ['rs1', 'rs2'])['rsid']) == ['rs1']
+    make_gwas_df(['rs2']).to_parquet(parquet_path)
+    stat = os.stat(parquet_path)
+    os.utime(parquet_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert list(query_gwas(str(parquet_path), ['rs1', 'rs2'])['rsid']) == ['rs2']
+
+def test_query_without_pyarrow(tmp_path, monkeypatch):
+    import scripts.query_gwas as query_gwas_module
+    monkeypatch.setattr(query_gwas_module, 'pa', None)
+    df = make_gwas_df(['rs1', 'rs2', 'rs3'])
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    result = query_gwas(str(parquet_path), ['rs3', None, 'rs1', 'rs3'])
+    assert sorted(result['rsid']) == ['rs1', 'rs3']
+    assert list(result.columns) == REQUIRED_COLUMNS
+
+def test_accepts_arrow_rsids_from_genotype_loader(tmp_path):
+    import pyarrow as pa
+    from scripts.load_user_genotype import load_user_genotype, rsid_array
+    genotype_path = tmp_path / "genotype.txt"
+    genotype_path.write_text("rsid\tgenotype\nrs3\tAA\nrs1\tAG\nrs3\tAA\n")
+    rsids = rsid_array(load_user_genotype(str(genotype_path)))
+    assert isinstance(rsids, pa.ChunkedArray)
+    df = make_gwas_df(['rs1', 'rs2', 'rs3'])
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    result = query_gwas(str(parquet_path), rsids)
+    assert sorted(result['rsid']) == ['rs1', 'rs3']
+
+def test_same_mtime_rewrite_is_requeried(tmp_path):
+    parquet_path = tmp_path / "gwas.parquet"
+    make_gwas_df(['rs1']).drop(columns=['ci_95_text']).to_parquet(parquet_path)
+    stat = os.stat(parquet_path)
+    with pytest.raises(GWASQueryError, match="Missing required columns: ci_95_text"):
+        query_gwas(str(parquet_path), ['rs1'])
+    make_gwas_df(['rs1']).to_parquet(parquet_path)
+    os.utime(parquet_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert list(query_gwas(str(parquet_path), ['rs1'])['rsid']) == ['rs1']
+
+def test_duckdb_file_is_writable_after_query(tmp_path):
+    import duckdb
+    df = make_gwas_df(['rs1', 'rs2'])
+    db_path = tmp_path / "gwas.duckdb"
+    con = duckdb.connect(str(db_path))
+    con.execute("CREATE TABLE associations_clean AS SELECT * FROM df")
+    con.close()
+    assert list(query_gwas(str(db_path), ['rs1'])['rsid']) == ['rs1']
+    con = duckdb.connect(str(db_path))
+    con.execute("DELETE FROM associations_clean WHERE rsid = 'rs1'")
+    con.close()
+    assert query_gwas(str(db_path), ['rs1']).empty
+
+def test_close_connections_clears_cache(tmp_path):
+    import scripts.query_gwas as query_gwas_module
+    parquet_path = tmp_path / "gwas.parquet"
+    make_gwas_df(['rs1']).to_parquet(parquet_path)
+    query_gwas(str(parquet_path), ['rs1'])
+    assert str(parquet_path) in query_gwas_module._CONNECTIONS
+    query_gwas_module.close_connections()
+    assert not query_gwas_module._CONNECTIONS
+    assert list(query_gwas(str(parquet_path), ['rs1'])['rsid']) == ['rs1']
+
+def test_accepts_multi_block_rsids_from_genotype_loader(tmp_path):
+    import pyarrow as pa
+    from scripts.load_user_genotype import load_user_genotype, rsid_array
+    genotype_path = tmp_path / "genotype.txt"
+    rows = ''.join(f"rs{i}\tAG\n" for i in range(200000))
+    genotype_path.write_text("rsid\tgenotype\n" + rows)
+    rsids = rsid_array(load_user_genotype(str(genotype_path)))
+    assert isinstance(rsids, pa.ChunkedArray)
+    assert rsids.num_chunks > 1
+    assert rsids.type == pa.string()
+    df = make_gwas_df(['rs5', 'rs199999', 'rs_absent'])
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    result = query_gwas(str(parquet_path), rsids)
+    assert sorted(result['rsid']) == ['rs199999', 'rs5']
+
+def test_duckdb_associations_view_is_used(tmp_path):
+    import duckdb
+    df = make_gwas_df(['rs1', 'rs2'])
+    db_path = tmp_path / "gwas.duckdb"
+    con = duckdb.connect(str(db_path))
+    con.execute("CREATE TABLE aaa_unrelated AS SELECT 1 AS x")
+    con.execute("CREATE TABLE raw_associations AS SELECT * FROM df")
+    con.execute("CREATE VIEW associations_clean AS SELECT * FROM raw_associations")
+    con.close()
+    result = query_gwas(str(db_path), ['rs2'])
+    assert list(result['rsid']) == ['rs2']
+
+def test_nan_rsids_are_dropped(tmp_path):
+    df = make_gwas_df(['rs1', 'rs2'])
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    result = query_gwas(str(parquet_path), ['rs1', float('nan'), None])
+    assert list(result['rsid']) == ['rs1']
+
+def test_unconvertible_rsids_raise(tmp_path):
+    df = make_gwas_df(['rs1'])
+    parquet_path = tmp_path / "gwas.parquet"
+    df.to_parquet(parquet_path)
+    with pytest.raises(GWASQueryError, match="Invalid rsid values"):
+        query_gwas(str(parquet_path), ['rs1', object()])